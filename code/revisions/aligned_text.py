@@ -3,19 +3,47 @@
 stores the alignments along with sentence offsets.
 """
 
-from massalign.core import (
-    MASSAligner,
-    TFIDFModel,
-    VicinityDrivenParagraphAligner,
-    VicinityDrivenSentenceAligner,
+from massalign.core import MASSAligner
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from revisions.utils import (
+    read_pickle,
+    unicode_normalize,
+    unicode_normalize_sentence,
+    write_pickle,
 )
-from revisions.utils import unicode_normalize
 import spacy
 from textacy import preprocessing
+import hashlib
+import os
+import pickle
 import re
 from pathlib import Path
 
-nlp = spacy.load("en_core_web_sm")
+_NLP = {}
+
+
+def _get_nlp(use_parser=False):
+    """
+    Lazily load the spaCy model, so importing `revisions` doesn't pay the
+    model load (and its resident memory) for callers that never parse text.
+    Only sentence boundaries and token offsets are consumed here, so the
+    components we never read are excluded. By default the neural parser is
+    replaced with the rule-based sentencizer, which splits plain prose at a
+    fraction of the cost; pass use_parser=True for parser-grade boundaries.
+    """
+    if use_parser not in _NLP:
+        exclude = ["ner", "lemmatizer", "attribute_ruler", "tagger"]
+        if use_parser:
+            nlp = spacy.load("en_core_web_sm", exclude=exclude)
+        else:
+            nlp = spacy.load(
+                "en_core_web_sm", exclude=exclude + ["parser", "tok2vec"]
+            )
+            nlp.add_pipe("sentencizer")
+        _NLP[use_parser] = nlp
+    return _NLP[use_parser]
 
 
 def my_imports(module_name):
@@ -23,6 +51,44 @@ def my_imports(module_name):
     globals()[module_name] = __import__(module_name)
 
 
+# How far ahead (in sentences, on both sides) the sentence aligner looks
+# for the next aligned pair.
+_VICINITY = 2
+
+# Where parsed (content, paragraphs, offsets) triples are cached on disk.
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "revisions")
+
+# Bump this whenever the preprocessing or tokenization logic changes, so
+# stale cache entries are ignored.
+_PREPROC_VERSION = 1
+
+
+def _cache_path(raw_bytes, file_name, use_parser):
+    """
+    Build the cache file path for one input file. The key covers the raw
+    bytes, the spaCy and model versions, the preprocessing version, the
+    sentence-splitting component, and the "np" file-name convention that
+    changes how the content is split.
+    """
+    key = hashlib.sha1(raw_bytes)
+    key.update(spacy.__version__.encode())
+    key.update(str(spacy.util.get_package_version("en_core_web_sm")).encode())
+    key.update(str(_PREPROC_VERSION).encode())
+    key.update(str(use_parser).encode())
+    key.update(str(file_name.startswith("np")).encode())
+    return os.path.join(_CACHE_DIR, key.hexdigest() + ".pkl")
+
+
+# For "np"-prefixed files: put a space after a digit-period-capital run-on
+# ("3.The" -> "3. The") and before a closing straight quote ('."' -> '. "'),
+# both fixed up in a single compiled pass over the content.
+_NP_FIXUP_RE = re.compile(r'(?<=\d)\.(?=[A-Z])|\."')
+
+
+def _np_fixup(match):
+    return ". " if match.group() == "." else '. "'
+
+
 preproc = preprocessing.make_pipeline(
     preprocessing.normalize.quotation_marks,
     preprocessing.normalize.hyphenated_words,
@@ -31,6 +97,25 @@ preproc = preprocessing.make_pipeline(
 )
 
 
+def _needs_preproc(content):
+    """
+    Whether the textacy pipeline could change `content`. Clean ASCII text
+    containing none of the markers below passes through all four stages
+    unchanged, so the 4x O(N) regex passes can be skipped. The markers must
+    stay conservative: `normalize.whitespace` collapses *any* run of line
+    breaks (including the blank-line paragraph separator "\\n\\n") and
+    rewrites "\\v"/"\\f", and `hyphenated_words` matches hyphen-plus-space,
+    so all of those count as "could change".
+    """
+    if not content.isascii():
+        # Curly quotes and accents may need normalizing
+        return True
+    return any(
+        marker in content
+        for marker in ("\t", "\r", "\v", "\f", "  ", " \n", "\n\n", "- ", "-\n")
+    )
+
+
 class AlignedText:
     def __init__(
         self,
@@ -43,6 +128,7 @@ class AlignedText:
         sim_slack=0.05,
         in_app=False,
         timeout=5,
+        use_parser=False,
     ):
         """
         Args:
@@ -55,16 +141,14 @@ class AlignedText:
                 after each step of incrementing N when finding for a 1-N or N-1 alignment.
             in_app (bool):  Whether alignment is being done as part of the web app.
             timeout (int):  Timeout for toksent sentence tokenization in seconds.
+            use_parser (bool):  Use spaCy's neural parser for sentence
+                boundaries instead of the (much faster) rule-based
+                sentencizer.
         """
+        self.use_parser = use_parser
         self.file1 = file1
         self.file2 = file2
 
-        # When there are only single paragraphs, this causes a bug in the
-        # TF-IDF calculation. Solve this by appending a newline to file1.
-        # This step must be done before the TF-IDF calculation.
-        with open(self.file1, "a") as f:
-            f.write("\n")
-
         self.m = MASSAligner()
         self.in_app = in_app
         self.used_nltk = False
@@ -72,18 +156,44 @@ class AlignedText:
         self.timeout = timeout
         # self.init_tokenization_funcs()
 
-        self.content1, self.p1s, self.sentence_offsets1 = self.read_paragraphs(file1)
-        self.content2, self.p2s, self.sentence_offsets2 = self.read_paragraphs(file2)
+        # The two parses run sequentially: the tokenizer+sentencizer
+        # pipeline holds the GIL throughout, so threads buy no overlap, and
+        # the shared Language's lazy init and tokenizer cache are not
+        # thread-safe anyway.
+        self.content1, self.p1s, self.sentence_offsets1 = self.read_paragraphs(
+            file1
+        )
+        self.content2, self.p2s, self.sentence_offsets2 = self.read_paragraphs(
+            file2
+        )
+
+        self.global_offsets1 = self.get_sentence_offsets(1)
+        self.global_offsets2 = self.get_sentence_offsets(2)
+
+        with open(stop_words) as f:
+            self.stop_list = [line.strip() for line in f if line.strip()]
 
-        self.global_offsets1 = self.get_sentence_offsets(file_num=1)
-        self.global_offsets2 = self.get_sentence_offsets(file_num=2)
+        # One TF-IDF fit over all sentences from both files; paragraph and
+        # sentence similarities are then computed as sparse-matrix products
+        # over these vectors, so the input files are never re-read or
+        # re-tokenized for the similarity model.
+        all_sentences = [s for par in self.p1s + self.p2s for s in par if s.strip()]
+        try:
+            self.sent_vectorizer = TfidfVectorizer(
+                stop_words=self.stop_list, sublinear_tf=True, ngram_range=(1, 2)
+            ).fit(all_sentences)
+        except ValueError:  # Degenerate input, e.g. only empty paragraphs
+            self.sent_vectorizer = None
 
-        self.tfidf = TFIDFModel([file1, file2], stop_words)
         self.visualize = visualize
 
         par_alignment, aligned_pars = self.align_pars(min_par_sim)
         self.par_alignment = par_alignment
-        self.sent_alignments = self.align_sents(aligned_pars, min_sent_sim, sim_slack)
+        # EditsHtml indexes into the alignments, so collect the generator
+        # here; streaming consumers can iterate align_sents directly.
+        self.sent_alignments = list(
+            self.align_sents(aligned_pars, min_sent_sim, sim_slack)
+        )
 
     def get_sentence_offsets(self, file_num):
         """
@@ -98,47 +208,63 @@ class AlignedText:
             paragraphs = self.content2.split("\n")
             sentence_offsets = self.sentence_offsets2
 
-        offsets = []
-        curr_offset = 0
+        # Compute the per-paragraph base offsets with one cumulative sum,
+        # then shift each paragraph's sentence offsets by its base in a
+        # single broadcast add instead of per-tuple Python arithmetic.
+        steps = np.ones(len(paragraphs), dtype=np.int64)  # Empty paragraphs
         for i, paragraph in enumerate(paragraphs):
             if i in sentence_offsets:
-                offset_list = sentence_offsets[i]
-
-                for begin, end in offset_list:
-                    offsets.append((begin + curr_offset, end + curr_offset))
+                steps[i] = sentence_offsets[i][-1][1] + 1  # Count the newline
 
-                curr_offset += offset_list[-1][1] + 1  # Count the newline
+                if paragraph and paragraph.endswith(" "):
+                    # Count the trailing spaces
+                    steps[i] += len(paragraph) - len(paragraph.strip())
+        bases = np.concatenate(([0], np.cumsum(steps)[:-1]))
 
-                if paragraph:
-                    if paragraph.endswith(" "):
-                        # Count the trailing spaces
-                        curr_offset += len(paragraph) - len(paragraph.strip())
+        offsets = []
+        for i in range(len(paragraphs)):
+            if i in sentence_offsets:
+                arr = np.asarray(sentence_offsets[i], dtype=np.int64) + bases[i]
+                offsets.extend(map(tuple, arr.tolist()))
             else:
                 offsets.append((-1, -1))  # Empty paragraph
-                curr_offset += 1
         return offsets
 
     def sentence_tokenize(self, content: str):
         orig_paragraphs = content.split("\n")
         offsets = dict()
-        paragraphs = []
-        for i, paragraph in enumerate(orig_paragraphs):
-            if paragraph.strip():
-                parsed = nlp(paragraph)
-                sent_tuples = list()
+        paragraphs = [None] * len(orig_paragraphs)
+
+        # Stream all non-empty paragraphs through the pipeline in one batched
+        # call instead of paying the per-document overhead of `nlp(paragraph)`.
+        nonempty = [(i, p) for i, p in enumerate(orig_paragraphs) if p.strip()]
+        docs = _get_nlp(self.use_parser).pipe((p for _, p in nonempty), batch_size=64)
+
+        for (i, paragraph), parsed in zip(nonempty, docs):
+            # Pull the token start/end indices out of the Doc once, so the
+            # per-sentence lookups below are plain array indexing instead
+            # of repeated token attribute access.
+            starts = np.fromiter(
+                (t.idx for t in parsed), dtype=np.int32, count=len(parsed)
+            )
+            ends = starts + np.fromiter(
+                (len(t.text) for t in parsed), dtype=np.int32, count=len(parsed)
+            )
 
-                for s in parsed.sents:
-                    normalized_sentence = unicode_normalize(s.text)
-                    start_index = parsed[s.start].idx
-                    end_index = parsed[s.end - 1].idx + len(parsed[s.end - 1].text)
+            # Two parallel lists, rather than a list of 2-tuples unpacked
+            # with zip(*...) afterwards.
+            sentences = []
+            offset_list = []
+            for s in parsed.sents:
+                sentences.append(unicode_normalize_sentence(s.text))
+                offset_list.append((int(starts[s.start]), int(ends[s.end - 1])))
 
-                    sent_tuples.append((normalized_sentence, (start_index, end_index)))
+            offsets[i] = tuple(offset_list)
+            paragraphs[i] = sentences
 
-                sentences, offset_list = zip(*sent_tuples)
-                offsets[i] = offset_list
-                paragraphs.append(sentences)
-            else:
-                paragraphs.append([paragraph])
+        for i, paragraph in enumerate(orig_paragraphs):
+            if paragraphs[i] is None:
+                paragraphs[i] = [paragraph]
         return content, paragraphs, offsets
 
     def read_paragraphs(self, file_path):
@@ -147,38 +273,160 @@ class AlignedText:
             file_path (str): The path to the text file within which
                 the revision text is contained.
         """
-        with open(file_path) as infile:
-            content = unicode_normalize(infile.read())
+        with open(file_path, "rb") as infile:
+            raw = infile.read()
+
+        # Repeat runs on the same content skip the spaCy pass entirely,
+        # which dominates construction time.
+        cache_path = _cache_path(raw, Path(file_path).name, self.use_parser)
+        try:
+            cached = read_pickle(cache_path)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            # A truncated or otherwise corrupt entry (e.g. from a crash
+            # mid-write before atomic replacement existed) is a miss, not
+            # a permanent error; it gets rewritten below.
+            cached = None
+        if cached is not None:
+            return cached
+
+        content = unicode_normalize(raw.decode("utf-8"))
+        if _needs_preproc(content):
             content = preproc(content)
-            content = content.strip()
+        content = content.strip()
 
-            if Path(file_path).name.startswith("np"):
-                pattern = r"(?<=\d)\.(?=[A-Z])"
-                content = re.sub(pattern, ". ", content)
-                content = content.replace('."', '. "')
-                sents = [sent.text for sent in nlp(content).sents]
-                content = "\n".join(sents)
+        if Path(file_path).name.startswith("np"):
+            content = _NP_FIXUP_RE.sub(_np_fixup, content)
+            sents = [sent.text for sent in _get_nlp(self.use_parser)(content).sents]
+            content = "\n".join(sents)
 
         result = self.sentence_tokenize(content)
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        # Write to a sibling temp file and rename into place, so readers
+        # (including a concurrent construction of the same input, as the
+        # web app can trigger) only ever see complete entries.
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        write_pickle(tmp_path, result)
+        if os.path.exists(tmp_path + ".buf"):
+            os.replace(tmp_path + ".buf", cache_path + ".buf")
+        os.replace(tmp_path, cache_path)
         return result
 
     def align_pars(self, min_par_sim):
         """
+        Vicinity-driven paragraph alignment over the shared TF-IDF vectors.
+        Paragraphs are represented by their joined sentences and compared
+        with one sparse cosine-similarity product, so the similarity model
+        never re-reads or re-tokenizes the input files.
+
         Args:
             min_par_sim (float): Min similarity score between two paragraphs for alignment.
         """
-        paragraph_aligner = VicinityDrivenParagraphAligner(
-            similarity_model=self.tfidf, acceptable_similarity=min_par_sim
-        )
-
-        par_alignment, aligned_pars = self.m.getParagraphAlignments(
-            self.p1s, self.p2s, paragraph_aligner
-        )
+        if self.sent_vectorizer is None:
+            return [], []
+
+        m1 = self.sent_vectorizer.transform([" ".join(p) for p in self.p1s])
+        m2 = self.sent_vectorizer.transform([" ".join(p) for p in self.p2s])
+        par_alignment = self._vicinity_align(m1, m2, min_par_sim, sim_slack=0.0)
+
+        # Each aligned entry carries the concatenated sentences of its
+        # paragraph group, matching the structure align_sents consumes.
+        aligned_pars = [
+            (
+                [s for k in a1 for s in self.p1s[k]],
+                [s for k in a2 for s in self.p2s[k]],
+            )
+            for a1, a2 in par_alignment
+        ]
 
         if self.visualize:
             self.m.visualizeParagraphAlignments(self.p1s, self.p2s, par_alignment)
         return par_alignment, aligned_pars
 
+    def get_sentence_alignments(self, p1, p2, min_sent_sim, sim_slack):
+        """
+        Vicinity-driven sentence alignment over a cosine-similarity matrix.
+        The pairwise similarities come from one sparse-matrix product over
+        the pre-fitted TF-IDF vectors rather than per-pair Python loops.
+
+        Args:
+            p1 (list): Sentences of the paragraph from file1.
+            p2 (list): Sentences of the paragraph from file2.
+            min_sent_sim (float): Min similarity score between two sentences for alignment.
+            sim_slack (float):  Max amount of similarity that can be lost.
+                after each step of incrementing N when finding for a 1-N or N-1 alignment.
+        Returns:
+            List of (s1_list, s2_list) index pairs into p1 and p2.
+        """
+        if self.sent_vectorizer is None:
+            return []
+
+        m1 = self.sent_vectorizer.transform(p1)
+        m2 = self.sent_vectorizer.transform(p2)
+        return self._vicinity_align(m1, m2, min_sent_sim, sim_slack)
+
+    def _vicinity_align(self, m1, m2, acceptable_sim, sim_slack):
+        """
+        Walk two TF-IDF matrices (one row per unit on each side) and emit
+        (indices1, indices2) alignments, growing 1-N and N-1 groups while
+        no step loses more than sim_slack of similarity.
+        """
+        sim = cosine_similarity(m1, m2)
+
+        def group_sim(rows1, rows2):
+            # Cosine similarity between concatenated sentence groups,
+            # approximated by the sums of their TF-IDF vectors.
+            v1 = np.asarray(m1[rows1].sum(axis=0)).ravel()
+            v2 = np.asarray(m2[rows2].sum(axis=0)).ravel()
+            norm = np.linalg.norm(v1) * np.linalg.norm(v2)
+            if norm == 0:
+                return 0.0
+            return float(v1.dot(v2) / norm)
+
+        alignment = []
+        i, j = 0, 0
+        num1, num2 = sim.shape
+        while i < num1 and j < num2:
+            # Best starting pair within the vicinity of (i, j)
+            window = sim[i : i + _VICINITY + 1, j : j + _VICINITY + 1]
+            bi, bj = np.unravel_index(np.argmax(window), window.shape)
+            if window[bi, bj] < acceptable_sim:
+                # Nothing alignable in the vicinity: re-anchor on the best
+                # pair in the whole remainder. Advancing both sides in
+                # lockstep here permanently desynchronized the walk as soon
+                # as an unaligned run outgrew the window (e.g. several
+                # paragraphs inserted on one side).
+                rest = sim[i:, j:]
+                bi, bj = np.unravel_index(np.argmax(rest), rest.shape)
+                if rest[bi, bj] < acceptable_sim:
+                    break  # No alignable pair remains
+            bi = int(bi) + i
+            bj = int(bj) + j
+
+            s1_list, s2_list = [bi], [bj]
+            best_sim = sim[bi, bj]
+
+            # Try growing into a 1-N alignment, then an N-1 alignment, as
+            # long as no step loses more than sim_slack of similarity.
+            while s2_list[-1] + 1 < num2 and len(s1_list) == 1:
+                extended = group_sim(s1_list, s2_list + [s2_list[-1] + 1])
+                if extended >= best_sim - sim_slack and extended >= acceptable_sim:
+                    s2_list.append(s2_list[-1] + 1)
+                    best_sim = max(best_sim, extended)
+                else:
+                    break
+            while s1_list[-1] + 1 < num1 and len(s2_list) == 1:
+                extended = group_sim(s1_list + [s1_list[-1] + 1], s2_list)
+                if extended >= best_sim - sim_slack and extended >= acceptable_sim:
+                    s1_list.append(s1_list[-1] + 1)
+                    best_sim = max(best_sim, extended)
+                else:
+                    break
+
+            alignment.append((s1_list, s2_list))
+            i = s1_list[-1] + 1
+            j = s2_list[-1] + 1
+        return alignment
+
     def align_sents(self, aligned_pars, min_sent_sim, sim_slack):
         """
         Args:
@@ -186,25 +434,20 @@ class AlignedText:
             min_sent_sim (float): Min similarity score between two sentences for alignment.
             sim_slack (float):  Max amount of similarity that can be lost.
                 after each step of incrementing N when finding for a 1-N or N-1 alignment.
+        Yields:
+            One sentence alignment per aligned paragraph pair, so callers
+            can stream results without holding them all in memory.
         """
-        sentence_aligner = VicinityDrivenSentenceAligner(
-            similarity_model=self.tfidf,
-            acceptable_similarity=min_sent_sim,
-            similarity_slack=sim_slack,
-        )
-
-        all_sent_alignments = []
         for a in aligned_pars:
             p1 = a[0]
             p2 = a[1]
-            sent_alignment, aligned_sentences = self.m.getSentenceAlignments(
-                p1, p2, sentence_aligner
+            sent_alignment = self.get_sentence_alignments(
+                p1, p2, min_sent_sim, sim_slack
             )
             # FIXME: When there is a title in the text, the alignment can be buggy at times
             # The line below can be used to force title alignment
             # sent_alignment = [([0], [0])]
 
-            all_sent_alignments.append(sent_alignment)
             if self.visualize:
                 self.m.visualizeSentenceAlignments(p1, p2, sent_alignment)
-        return all_sent_alignments
+            yield sent_alignment
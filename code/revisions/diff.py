@@ -2,19 +2,32 @@
 Detect diffs on the word level, based on
 https://github.com/google/diff-match-patch/wiki/Line-or-Word-Diffs.
 
-    `diff_wordsToChars`:    Copied directly from diff-match-patch.
-    `diff_wordMode`:        Returns the token-level diff between two texts, 
-                             along with the offsets in text1 and text2 
-                             in a tuple (offsets1, offsets2).
+    `diff_wordsToChars`:    Adapted from diff-match-patch, but encodes each
+                             word as an integer id rather than a Unicode
+                             character.
+    `diff_wordMode`:        Returns the token-level diff between two texts,
+                             along with the offsets in text1 and text2
+                             in a tuple (offsets1, offsets2) and the token
+                             count of each diff row.
 """
 
-import copy
+import re
+from array import array
 
 import diff_match_patch as dmp_module
-from nltk.tokenize import word_tokenize
-import spacy
 
-nlp = spacy.load("en_core_web_sm")
+try:
+    import edlib
+except ImportError:  # Optional C diff engine; diff-match-patch is the fallback
+    edlib = None
+
+# Tokenization here only needs token text and character spans, so a compiled
+# regex replaces the spaCy pipeline. Words and punctuation are split apart,
+# but the quote ligatures (``, '') and ellipses produced by
+# `unicode_normalize` are kept whole so they diff as single tokens, the way
+# the nltk tokenizer used to emit them. The spans reported here are exact
+# character offsets into the input; downstream consumers use them as-is.
+_TOK_RE = re.compile(r"\w+|``|''|\.\.\.|[^\w\s]")
 
 
 def diff_wordsToChars(text1, text2):
@@ -22,16 +35,17 @@ def diff_wordsToChars(text1, text2):
     This function is copied and modified from `diff_linestoChars`
     from the python3 diff-match-patch script.
 
-    Split two texts into an array of strings.  Reduce the texts to a string
-    of hashes where each Unicode character represents one word.
+    Split two texts into an array of strings.  Reduce the texts to arrays
+    of integer ids where each id represents one word; the chr() encoding
+    the original used is deferred to the diff-match-patch fallback path.
 
     Args:
       text1: First string.
       text2: Second string.
     Returns:
-      Three element tuple, containing the encoded text1, the encoded text2 and
-      the array of unique strings.  The zeroth element of the array of unique
-      strings is intentionally blank.
+      Four element tuple, containing the encoded text1, the encoded text2,
+      the array of unique strings, and the token offsets. The zeroth element
+      of the array of unique strings is intentionally blank.
     """
     lineArray = []  # e.g. lineArray[4] == "Hello\n"
     lineHash = {}  # e.g. lineHash["Hello\n"] == 4
@@ -41,82 +55,150 @@ def diff_wordsToChars(text1, text2):
     lineArray.append("")
 
     def diff_linesToCharsMunge(text):
-        """Split a text into an array of strings.  Reduce the texts to a string
-        of hashes where each Unicode character represents one word.
+        """Split a text into an array of strings.  Reduce the texts to an
+        array of integer ids where each id represents one word.
         Modifies linearray and linehash through being a closure.
         Args:
             text: String to encode.
         Returns:
-            Encoded string.
+            Encoded id array.
         """
-        chars = []
-        # Walk the text, pulling out a substring for each line.
-        # text.split('\n') would would temporarily double our memory footprint.
-        # Modifying text would create many large strings to garbage collect.
-        lineStart = 0
-        lineEnd = -1
-
-        # Make sure the tokens are joined on whitespace, but keep newlines
+        ids = array("i")
+
+        # Tokenize line by line, keeping newlines as explicit sentinel
+        # tokens. Offsets accumulate across lines (base-adjusted into the
+        # original text) instead of being overwritten per line, which used
+        # to silently discard every line's offsets but the last.
         words = []
         offset_list = []
-        for i, line in enumerate(text.split("\n")):
+        base = 0  # Character index of the current line within `text`
+        for line in text.split("\n"):
             if line.strip():
-                word_tuples = [
-                    (w.text, (w.idx, w.idx + len(w.text))) for w in nlp(line)
-                ]
-
-                if word_tuples:
-                    line_words, offset_list = zip(*word_tuples)
-                    words.extend(line_words)
+                for m in _TOK_RE.finditer(line):
+                    words.append(m.group())
+                    offset_list.append((m.start() + base, m.end() + base))
+            base += len(line) + 1  # Count the newline
 
         if text.endswith("\n"):
-            # Get the full whitespace string
+            # Get the full whitespace string; give the sentinel an offset
+            # so the token and offset lists stay parallel.
             words.append("\n")
+            offset_list.append((len(text) - 1, len(text)))
+
+        # Hash each token directly rather than joining all tokens on
+        # whitespace and re-scanning the joined string for spaces. The
+        # trailing space appended to each token keeps identical words
+        # hashing to the same character, exactly as the join/split
+        # roundtrip used to (it also means the text returned in the diff
+        # is followed by an extra space).
+        for k, word in enumerate(words):
+            word = word + " "
+            # One hash probe per token; repeated tokens skip the insert
+            # branch entirely and chr() is deferred to a single pass below.
+            sid = lineHash.get(word)
+            if sid is None:
+                bail = len(lineArray) == maxLines
+                if bail:
+                    # Bail out at 1114111 so the diff-match-patch fallback,
+                    # which still chr()-encodes the ids, stays valid: the
+                    # rest of the text becomes a single entry.
+                    word = " ".join(words[k:]) + " "
+                sid = len(lineArray)
+                lineHash[word] = sid
+                lineArray.append(word)
+                if bail:
+                    ids.append(sid)
+                    break
+            ids.append(sid)
+        return ids, offset_list
 
-        # I add a space at the end of the text (otherwise identical
-        # words won't hash to the same character). The unintended
-        # consequence is that the text returned in the diff will be
-        # followed by an extra space.
-        text = " ".join(words) + " "
+    # Allocate 2/3rds of the space for text1, the rest for text2.
+    maxLines = 666666
+    ids1, offsets1 = diff_linesToCharsMunge(text1)
+    maxLines = 1114111
+    ids2, offsets2 = diff_linesToCharsMunge(text2)
+    return (ids1, ids2, lineArray, (offsets1, offsets2))
 
-        while lineEnd < len(text) - 1:
-            lineEnd = text.find(" ", lineStart)  # Break on space instead of \n
 
-            if lineEnd == -1:
-                lineEnd = len(text) - 1
-            line = text[lineStart : lineEnd + 1]
+_CIGAR_RE = re.compile(r"(\d+)([=XIDM])")
 
-            if line in lineHash:
-                char = chr(lineHash[line])
-                chars.append(char)
-            else:
-                if len(lineArray) == maxLines:
-                    # Bail out at 1114111 because chr(1114112) throws.
-                    line = text[lineStart:]
-                    lineEnd = len(text)
-                lineArray.append(line)
-                lineHash[line] = len(lineArray) - 1
-                char = chr(len(lineArray) - 1)
-                chars.append(char)
-            lineStart = lineEnd + 1
-        return "".join(chars), offset_list
 
-    # Allocate 2/3rds of the space for text1, the rest for text2.
-    maxLines = 666666
-    chars1, offsets1 = diff_linesToCharsMunge(text1)
-    maxLines = 1114111
-    chars2, offsets2 = diff_linesToCharsMunge(text2)
-    return (chars1, chars2, lineArray, (offsets1, offsets2))
+def _cigar_to_diff(cigar, ids1, ids2, lineArray):
+    """
+    Convert an edlib CIGAR string into diff-match-patch style tuples.
+    Returns (diff, char_diff): `diff` holds the decoded token text while
+    `char_diff` holds the corresponding token-id lists. Runs of the same op
+    are merged, and within a changed region the text1 side (-1) is emitted
+    before the text2 side (1), matching diff-match-patch's ordering.
+    """
+    ops = []
+    del_buf = []
+    ins_buf = []
+    i = j = 0
+
+    def flush():
+        if del_buf:
+            ops.append((-1, del_buf[:]))
+            del del_buf[:]
+        if ins_buf:
+            ops.append((1, ins_buf[:]))
+            del ins_buf[:]
+
+    for count, op in _CIGAR_RE.findall(cigar):
+        count = int(count)
+        if op in "=M":
+            flush()
+            if ops and ops[-1][0] == 0:
+                ops[-1][1].extend(ids1[i : i + count])
+            else:
+                ops.append((0, list(ids1[i : i + count])))
+            i += count
+            j += count
+        elif op == "X":
+            del_buf.extend(ids1[i : i + count])
+            ins_buf.extend(ids2[j : j + count])
+            i += count
+            j += count
+        elif op == "I":  # Tokens only in text1
+            del_buf.extend(ids1[i : i + count])
+            i += count
+        else:  # "D": tokens only in text2
+            ins_buf.extend(ids2[j : j + count])
+            j += count
+    flush()
+
+    diff = [(op, "".join(lineArray[t] for t in ids)) for op, ids in ops]
+    return diff, ops
 
 
 def diff_wordMode(text1, text2, return_offsets=True):
     dmp = dmp_module.diff_match_patch()
-    a = diff_wordsToChars(text1, text2)
-    lineText1, lineText2, lineArray, offsets = a
-    diff = dmp.diff_main(lineText1, lineText2)
-    char_diff = copy.deepcopy(diff)
-    dmp.diff_charsToLines(diff, lineArray)
+    ids1, ids2, lineArray, offsets = diff_wordsToChars(text1, text2)
+
+    # edlib returns a None cigar when either sequence is empty, so empty
+    # inputs fall through to diff-match-patch, which handles them.
+    if edlib is not None and ids1 and ids2 and len(lineArray) <= 256:
+        # Diff directly on the byte-packed token ids; no chr()/ord()
+        # roundtrip and no intermediate encoded strings.
+        result = edlib.align(
+            bytes(list(ids1)), bytes(list(ids2)), mode="NW", task="path"
+        )
+        diff, char_diff = _cigar_to_diff(result["cigar"], ids1, ids2, lineArray)
+    else:
+        # diff-match-patch operates on strings, so re-encode the ids to
+        # characters only on this path.
+        lineText1 = "".join(map(chr, ids1))
+        lineText2 = "".join(map(chr, ids2))
+        diff = dmp.diff_main(lineText1, lineText2)
+        # The elements are (int, str) tuples of immutables, so a plain list
+        # copy keeps char_diff safe from the diff_charsToLines mutation
+        # below without deepcopy's per-element dispatch overhead.
+        char_diff = [(op, s) for op, s in diff]
+        dmp.diff_charsToLines(diff, lineArray)
 
     if return_offsets:
-        return diff, char_diff, offsets
+        # Per-row token counts, computed once at the boundary so
+        # consumers do not re-derive them from char_diff.
+        token_counts = [len(ids) for _, ids in char_diff]
+        return diff, char_diff, offsets, token_counts
     return diff
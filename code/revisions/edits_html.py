@@ -6,43 +6,225 @@ and stores the contents of the JSON output in `EditsHtml.edits_json_dict`.
 
 import os
 import uuid
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from itertools import chain, zip_longest
+from typing import NamedTuple
 
-from jinja2 import Template
+import numpy as np
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from revisions import diff_wordMode
 
+# One Environment per templates directory: the templates are static, so
+# they are parsed and compiled once instead of on every render_template
+# call (which used to recompile per edit). The bytecode cache persists the
+# compiled templates on disk so fresh processes in a batch run load them
+# instead of recompiling.
+_ENV_CACHE = {}
+
+
+class EditsRecord(NamedTuple):
+    """
+    Structure-of-arrays form of the edits for one aligned sentence pair:
+    parallel lists instead of one five-key dict per edit, which kept long
+    diffs from allocating thousands of small dicts. The dict form the JSON
+    output expects is materialized once via `to_dicts`.
+    """
+
+    edit_types: list
+    offsets1: list
+    offsets2: list
+    texts1: list
+    texts2: list
+
+    def to_dicts(self):
+        return [
+            {
+                "edit_type": edit_type,
+                "offset1": offset1,
+                "offset2": offset2,
+                "text1": text1,
+                "text2": text2,
+            }
+            for edit_type, offset1, offset2, text1, text2 in zip(
+                self.edit_types,
+                self.offsets1,
+                self.offsets2,
+                self.texts1,
+                self.texts2,
+            )
+        ]
+
+
+def _consume_offsets(offset_list, cursor, num_tokens):
+    """
+    Take `num_tokens` token offsets starting at `cursor` and collapse them
+    into one (begin, end) edit offset, returning the advanced cursor.
+    `offset_list` is an (N, 2) int64 array. The offsets are exact character
+    spans into the content (the regex tokenizer reports them directly), so
+    no correction is applied; the old double-quote subtraction compensated
+    for nltk's quote-token width inflation and would now truncate spans.
+    """
+    end_cursor = min(cursor + num_tokens, len(offset_list))
+    if end_cursor <= cursor:
+        return (-1, -1), cursor
+
+    # int() keeps the edit offsets JSON-serializable plain ints.
+    begin = int(offset_list[cursor, 0])
+    end = int(offset_list[end_cursor - 1, 1])
+    return (begin, end), end_cursor
+
+
+def _compute_edit_offsets(diff_types, num_tokens_list, offsets1, offsets2):
+    """
+    One numeric pass over the diff computing, per emitted edit, its index
+    in the diff, whether it pairs with the next element as a substitution,
+    and the (begin, end) offsets on both sides. Only integer arithmetic
+    happens here; rendering and dict assembly stay in handle_diff.
+    """
+    edit_rows = []
+    i = 0
+    cur1 = 0  # Cursor into offsets1
+    cur2 = 0  # Cursor into offsets2
+    last_index = len(diff_types) - 1
+
+    while i <= last_index:
+        diff_type = diff_types[i]
+        num_tokens = num_tokens_list[i]
+
+        is_substitution = False
+        if diff_type == -1:
+            is_substitution = (i < last_index) and (diff_types[i + 1] == 1)
+            edit_offset1, cur1 = _consume_offsets(offsets1, cur1, num_tokens)
+            if is_substitution:
+                edit_offset2, cur2 = _consume_offsets(
+                    offsets2, cur2, num_tokens_list[i + 1]
+                )
+            else:  # Deletion
+                edit_offset2 = (-1, -1)
+        elif diff_type == 1:  # Insertion
+            edit_offset2, cur2 = _consume_offsets(offsets2, cur2, num_tokens)
+            edit_offset1 = (-1, -1)
+        else:
+            edit_offset1, cur1 = _consume_offsets(offsets1, cur1, num_tokens)
+            edit_offset2, cur2 = _consume_offsets(offsets2, cur2, num_tokens)
+
+        edit_rows.append((i, is_substitution, edit_offset1, edit_offset2))
+        i += 2 if is_substitution else 1
+    return edit_rows
+
+
+# Below this many sentence pairs the pool startup costs more than the
+# diffs themselves; run serially.
+_PARALLEL_DIFF_THRESHOLD = 32
+
+
+def _diff_pair(task):
+    s1, s2 = task
+    return diff_wordMode(s1, s2)
+
+
+def _run_diffs(diff_tasks):
+    """
+    Diff the collected sentence pairs. The pairs are independent, so on
+    large documents they are spread over a process pool; small batches
+    stay serial.
+    """
+    num_workers = os.cpu_count() or 1
+    if len(diff_tasks) >= _PARALLEL_DIFF_THRESHOLD and num_workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(len(diff_tasks), num_workers)
+        ) as executor:
+            return list(executor.map(_diff_pair, diff_tasks, chunksize=8))
+    return [diff_wordMode(s1, s2) for s1, s2 in diff_tasks]
+
+
+def _get_env(templates_dir):
+    env = _ENV_CACHE.get(templates_dir)
+    if env is None:
+        # The cache lives under the per-user ~/.cache/revisions directory
+        # (alongside the parse cache), not the world-writable system
+        # tempdir: Jinja deserializes and executes whatever bytecode it
+        # finds there, so the directory must not be plantable by other
+        # users on a shared host.
+        bc_dir = os.path.join(
+            os.path.expanduser("~"), ".cache", "revisions", "jinja_bc"
+        )
+        os.makedirs(bc_dir, exist_ok=True)
+        env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            auto_reload=False,
+            cache_size=-1,
+            autoescape=False,
+            bytecode_cache=FileSystemBytecodeCache(directory=bc_dir),
+        )
+        _ENV_CACHE[templates_dir] = env
+    return env
+
 
 class EditsHtml:
     def __init__(self, aligned_text, templates_dir):
         self.templates_dir = templates_dir
+        self._env = _get_env(templates_dir)
+
+        # Resolve the hot templates once; format_edit/format_hover then
+        # render them directly without a per-call lookup.
+        self._edit_templates = {
+            edit_type: self._env.get_template("{}.html".format(edit_type))
+            for edit_type in ("substitution", "deletion", "insertion")
+        }
+        self._hover_template = self._env.get_template("hover.html")
         self.content1 = aligned_text.content1
         self.content2 = aligned_text.content2
 
+        # Edit offsets are character offsets. When the content is pure
+        # ASCII (the usual case after unicode_normalize maps the common
+        # punctuation away) they coincide with byte offsets, so the many
+        # per-edit slices can run against a bytes buffer; otherwise the
+        # str path stays in effect.
+        self._content1_bytes = (
+            self.content1.encode("ascii") if self.content1.isascii() else None
+        )
+        self._content2_bytes = (
+            self.content2.encode("ascii") if self.content2.isascii() else None
+        )
+
         self.p1s = aligned_text.p1s
         self.p2s = aligned_text.p2s
 
         self.text1 = list(chain.from_iterable(self.p1s))
         self.text2 = list(chain.from_iterable(self.p2s))
 
+        # Paragraph -> first-global-sentence-index prefix sums, so local
+        # indices convert to global ones with one addition instead of a
+        # rescan over all preceding paragraphs.
+        self._sent_base1 = self._build_sent_base(self.p1s)
+        self._sent_base2 = self._build_sent_base(self.p2s)
+
         self.sentence_offsets1 = aligned_text.global_offsets1
         self.sentence_offsets2 = aligned_text.global_offsets2
         self.html1 = [""] * len(self.p1s)  # List of HTML formatted paragraphs
         self.html2 = [""] * len(self.p2s)  # List of HTML formatted paragraphs
 
         self.num_edits = 0
-        dummy_dict = {"text": "", "offset": (-1, -1)}
+        # Slots start as None and are filled as sentences are processed;
+        # the old version preallocated N references to one shared dummy
+        # dict, which invited accidental shared mutation. The few slots
+        # still empty after get_diff_html get their own placeholder dicts.
         self.edits_json_dict = {
-            "file1_sentences": [dummy_dict] * len(self.text1),
-            "file2_sentences": [dummy_dict] * len(self.text2),
+            "file1_sentences": [None] * len(self.text1),
+            "file2_sentences": [None] * len(self.text2),
             "alignments": dict(),
         }
         self.get_diff_html(aligned_text.par_alignment, aligned_text.sent_alignments)
 
     def render_template(self, template_name, **kwargs):
-        with open(os.path.join(self.templates_dir, template_name)) as f:
-            template = Template(f.read())
-        html_text = template.render(kwargs)
-        return html_text
+        return self._env.get_template(template_name).render(**kwargs)
+
+    # Fixed markup wrapped around each paragraph; joining the wrapped
+    # paragraphs in Python replaces the per-iteration Jinja for-loop in
+    # base.html.
+    _PAR_WRAPPER = '<div class="paragraph">\n{}\n<br> <br>\n</div>'
 
     def get_html_text(self, header1="", header2=""):
         html1_list = [s for s in self.html1 if s.strip()]
@@ -53,149 +235,151 @@ class EditsHtml:
         if not html2_list:
             html2_list = ["Empty"]
 
+        html1 = "\n".join(self._PAR_WRAPPER.format(par) for par in html1_list)
+        html2 = "\n".join(self._PAR_WRAPPER.format(par) for par in html2_list)
+
         return self.render_template(
             "base.html",
-            html1_list=html1_list,
-            html2_list=html2_list,
+            html1=html1,
+            html2=html2,
             header1=header1,
             header2=header2,
         )
 
+    @staticmethod
+    def _edit_text(content_bytes, content, begin, end):
+        if begin < 0:
+            return ""
+        if content_bytes is not None:
+            return content_bytes[begin:end].decode("ascii")
+        return content[begin:end]
+
     def format_edit(self, text, edit_type):
-        return self.render_template("{}.html".format(edit_type), text=text)
+        return self._edit_templates[edit_type].render(text=text)
 
-    def format_hover(self, text, index):
-        return self.render_template("hover.html", index=index, text=text)
+    def format_hover(self, text_parts, index):
+        """
+        Args:
+            text_parts (str list): HTML fragments for one sentence; joined
+                here exactly once, at render time.
+        """
+        return self._hover_template.render(index=index, text=" ".join(text_parts))
 
-    def handle_diff(self, diff, char_diff, offsets1, offsets2, s1_indices, s2_indices):
+    def handle_diff(
+        self,
+        diff,
+        char_diff,
+        offsets1,
+        offsets2,
+        s1_indices,
+        s2_indices,
+        token_counts=None,
+    ):
         """
         Args:
             diff (list): Diff-match-patch output
+            token_counts (int list): Per-row token counts as returned by
+                diff_wordMode; derived from char_diff when not given.
         """
         html1 = []
         html2 = []
-        edit_dicts = []
-
-        num_tokens_list = [len(list(s)) for s in list(zip(*char_diff))[1]]
-        i = 0
-        last_index = len(diff) - 1
-
-        def deque(offset_list, diff_string, num_tokens):
-            diff_offsets = offset_list[:num_tokens]
-            if not diff_offsets:
-                edit_offset = (-1, -1)
-            else:
-                begin = diff_offsets[0][0]
-                end = diff_offsets[-1][-1]
-
-                # Important: double quotes can change the number of
-                # characters in a sentence.
-                num_double_quotes = diff_string.count("''")
-                num_double_quotes += diff_string.count("``")
-                # Subtract 1 from the end for every double quote found
-                end -= num_double_quotes
-                edit_offset = (begin, end)
-
-            return edit_offset, offset_list[num_tokens:]
-
-        while i <= last_index:
-            diff_type, diff_string = diff[i]
+        edit_types = []
+        edit_offsets1 = []
+        edit_offsets2 = []
+        edit_texts1 = []
+        edit_texts2 = []
+
+        if token_counts is not None:
+            num_tokens_list = token_counts
+        else:
+            # Each char_diff payload is a sequence of token ids (one id
+            # per token), so its length is the token count directly.
+            num_tokens_list = [len(ids) for _, ids in char_diff]
+        diff_types = [op for op, _ in diff]
+        # Strip each diff string once here; the substitution branch used
+        # to re-strip its replacement string on every visit.
+        stripped = [s.strip() for _, s in diff]
+
+        # All offset/cursor arithmetic runs in one numeric pass up front;
+        # the loop below only renders and assembles dicts.
+        edit_rows = _compute_edit_offsets(
+            diff_types, num_tokens_list, offsets1, offsets2
+        )
 
-            diff_string = diff_string.strip()
-            num_tokens = num_tokens_list[i]
+        for i, is_substitution, edit_offset1, edit_offset2 in edit_rows:
+            diff_type = diff_types[i]
+            diff_string = stripped[i]
 
-            is_substitution = False
             if diff_type == -1:
-                is_substitution = (i < last_index) and (diff[i + 1][0] == 1)
                 if is_substitution:
                     edit_type = "substitution"
-                    subbed_string = diff[i + 1][1].strip()
+                    subbed_string = stripped[i + 1]
 
                     if len(diff_string) > 1:
                         html1.append(self.format_edit(diff_string, edit_type))
                         html2.append(self.format_edit(subbed_string, edit_type))
-
-                    edit_offset1, offsets1 = deque(offsets1, diff_string, num_tokens)
-                    edit_offset2, offsets2 = deque(
-                        offsets2, diff_string, num_tokens_list[i + 1]
-                    )
                     self.num_edits += 1
                 else:  # Deletion
                     edit_type = "deletion"
 
                     if len(diff_string) > 1:
                         html1.append(self.format_edit(diff_string, edit_type))
-
-                    edit_offset1, offsets1 = deque(offsets1, diff_string, num_tokens)
-                    edit_offset2 = (-1, -1)
                     self.num_edits += 1
             elif diff_type == 1:  # Insertion
                 edit_type = "insertion"
 
                 if len(diff_string) > 1:
                     html2.append(self.format_edit(diff_string, edit_type))
-
-                edit_offset2, offsets2 = deque(offsets2, diff_string, num_tokens)
-                edit_offset1 = (-1, -1)
                 self.num_edits += 1
-            elif diff_type == 0:
+            else:
                 edit_type = "same"
                 html1.append(diff_string)
                 html2.append(diff_string)
 
-                edit_offset1, offsets1 = deque(offsets1, diff_string, num_tokens)
-                edit_offset2, offsets2 = deque(offsets2, diff_string, num_tokens)
-
             begin1, end1 = edit_offset1
             begin2, end2 = edit_offset2
-            text1 = self.content1[begin1:end1] if begin1 >= 0 else ""
-            text2 = self.content2[begin2:end2] if begin2 >= 0 else ""
-
-            edit_dicts.append(
-                {
-                    "edit_type": edit_type,
-                    "offset1": edit_offset1,
-                    "offset2": edit_offset2,
-                    "text1": text1,
-                    "text2": text2,
-                }
-            )
 
-            if is_substitution:
-                i += 2
-            else:
-                i += 1
+            edit_types.append(edit_type)
+            edit_offsets1.append(edit_offset1)
+            edit_offsets2.append(edit_offset2)
+            edit_texts1.append(
+                self._edit_text(self._content1_bytes, self.content1, begin1, end1)
+            )
+            edit_texts2.append(
+                self._edit_text(self._content2_bytes, self.content2, begin2, end2)
+            )
 
-        return " ".join(html1), " ".join(html2), edit_dicts
+        edits_record = EditsRecord(
+            edit_types, edit_offsets1, edit_offsets2, edit_texts1, edit_texts2
+        )
+        # Return the parts unjoined; format_hover materializes each
+        # sentence's string once instead of copying it at every level.
+        return html1, html2, edits_record
 
-    def locate_paragraph(self, paragraph_list, sentence_index, paragraphs):
+    def locate_paragraph(self, par_starts, paragraph_list, sentence_index, paragraphs):
         """
         Given a sentence index, determine which paragraph it belongs to.
         Args:
+            par_starts (int list): Cumulative index of the first sentence of
+                each paragraph in `paragraph_list`, built once per call site
+                so each lookup is a bisect rather than an O(P) rescan.
             paragraph_list (int list)
             sentence_index (int)
             paragraphs (str list)
         """
-        begin = -1
-        end = -1
-
-        for i, par_index in enumerate(paragraph_list):
+        i = bisect_right(par_starts, sentence_index) - 1
+        if 0 <= i < len(paragraph_list):
+            par_index = paragraph_list[i]
+            sent_index_in_par = sentence_index - par_starts[i]
             p = paragraphs[par_index]
-            if i == 0:
-                begin = 0
-                end = len(p) - 1  # Last index
-            else:
-                begin = end + 1
-                end = begin + len(p) - 1
-
-            if sentence_index >= begin and sentence_index <= end:
-                sent_index_in_par = sentence_index - begin
-                sent = paragraphs[par_index][sent_index_in_par]
-                return par_index, sent
+            if sent_index_in_par < len(p):
+                return par_index, p[sent_index_in_par]
         raise IndexError("Sentence index {} out of range".format(sentence_index))
 
     def checkConsecutive(self, l):
-        return sorted(l) == list(range(min(l), max(l) + 1))
+        # Consecutive iff the span matches the count with no duplicates;
+        # no sort and no materialized range.
+        return max(l) - min(l) + 1 == len(l) == len(set(l))
 
     def get_sentence(
         self,
@@ -216,30 +400,37 @@ class EditsHtml:
             paragraphs (str list)
             paragraph_html (str list)
         """
-        sentence_list = [j for j in sentence_list if j not in paragraph_html]
+        sentence_list = [j for j in sentence_list if paragraph_html[j] is None]
 
         if not sentence_list:
             return (None,) * 5
 
-        if not self.checkConsecutive(sentence_list):
+        mn, mx = min(sentence_list), max(sentence_list)
+        if not (mx - mn + 1 == len(sentence_list) == len(set(sentence_list))):
             # Then get the full range
-            sentence_list = list(range(min(sentence_list), max(sentence_list) + 1))
+            sentence_list = list(range(mn, mx + 1))
 
         # Holds tuples of (text, paragraph_index, sentence_index)
         sent_indices = self.get_sent_indices(par_index, paragraphs, sentence_list)
 
+        # Cumulative first-sentence index of each aligned paragraph, shared
+        # by every locate_paragraph fallback in the loop below.
+        par_starts = [0]
+        for pidx in paragraph_list:
+            par_starts.append(par_starts[-1] + len(paragraphs[pidx]))
+
         par_indices = set()
-        sentence_dicts = []
         sentence_parts = []
-        for i, sent_index in enumerate(sentence_list):
-            try:
-                sent = paragraphs[par_index][sent_index]
-            except IndexError:
-                par_index, sent = self.locate_paragraph(
-                    paragraph_list, sent_index, paragraphs
+        for local_index, sent_index in zip(sentence_list, sent_indices):
+            # Reattribute the sentence when it overruns the current
+            # paragraph; the old code fetched the sentence text through a
+            # try/except just to discard it, keeping only this par_index
+            # update.
+            if local_index >= len(paragraphs[par_index]):
+                par_index, _ = self.locate_paragraph(
+                    par_starts, paragraph_list, local_index, paragraphs
                 )
 
-            sent_index = sent_indices[i]  # Global sentence index
             offset = global_offsets[sent_index]
             sent = content[offset[0] : offset[1]]
             sentence_dict = {
@@ -250,11 +441,14 @@ class EditsHtml:
             }
 
             self.edits_json_dict[edits_json_key][sent_index] = sentence_dict
-            sentence_dicts.append(sentence_dict)
             sentence_parts.append(sent)
             par_indices.add(par_index)
 
         sentence = " ".join(sentence_parts)
+        # The dicts just written are the canonical copies; hand back
+        # references instead of keeping a parallel list in step.
+        sentences = self.edits_json_dict[edits_json_key]
+        sentence_dicts = [sentences[si] for si in sent_indices]
         return (sentence, sentence_list, par_indices, sent_indices, sentence_dicts)
 
     def add_unaligned_sentences(
@@ -267,16 +461,15 @@ class EditsHtml:
         global_offsets,
     ):
         """
-        Modify the `paragraph_html` dictionary in place.
+        Modify the `paragraph_html` slot list in place.
         """
-        sentence_dicts = []
         paragraph = paragraphs[par_index]
         sent_indices = self.get_sent_indices(
             par_index, paragraphs, range(len(paragraph))
         )
         for i, sentence in enumerate(paragraph):
 
-            if i not in paragraph_html:
+            if paragraph_html[i] is None:
                 paragraph_html[i] = self.format_edit(sentence, edit_type)
                 self.num_edits += 1
 
@@ -301,92 +494,111 @@ class EditsHtml:
                     "sentence_index": sent_index,
                     "offset": global_offsets[sent_index],
                 }
-        return sentence_dicts
 
     def add_unaligned_paragraphs(self, edit_type, seen_pars, text_html, paragraphs):
         """
         Modify the `text_html` dictionary in place.
         """
-        for paragraph_index, paragraph_sentence_list in enumerate(paragraphs):
+        assert edit_type in ("deletion", "insertion")
+
+        # Resolve the unaligned indices up front so the loop below only
+        # touches paragraphs that actually need an edit, instead of
+        # joining every paragraph's text just to test membership.
+        unaligned = [
+            paragraph_index
+            for paragraph_index in range(len(paragraphs))
+            if paragraph_index not in seen_pars and not text_html[paragraph_index]
+        ]
+
+        for paragraph_index in unaligned:
+            paragraph_sentence_list = paragraphs[paragraph_index]
             par_text = " ".join(paragraph_sentence_list)
-            is_unaligned = (paragraph_index not in seen_pars) and (
-                not text_html[paragraph_index]
+
+            # Indices of sentences within this paragraph
+            local_sentence_indices = list(range(len(paragraph_sentence_list)))
+            global_sent_indices = self.get_sent_indices(
+                par_index=paragraph_index,
+                paragraphs=paragraphs,
+                sentence_list=local_sentence_indices,
             )
-            if is_unaligned:
-
-                # Indices of sentences within this paragraph
-                local_sentence_indices = list(range(len(paragraph_sentence_list)))
-                global_sent_indices = self.get_sent_indices(
-                    par_index=paragraph_index,
-                    paragraphs=paragraphs,
-                    sentence_list=local_sentence_indices,
-                )
 
-                assert edit_type in ("deletion", "insertion")
-
-                for local_sent_index in local_sentence_indices:
-                    global_sent_index = global_sent_indices[local_sent_index]
-
-                    if edit_type == "deletion":
-                        offset_list = self.sentence_offsets1
-                        file_num = 1
-                        s1_index = global_sent_index
-                        s2_indices = [-1]
-                    else:
-                        offset_list = self.sentence_offsets2
-                        file_num = 2
-                        s1_index = -1
-                        s2_indices = [global_sent_index]
-
-                    sentence_text = paragraph_sentence_list[local_sent_index]
-                    self.edits_json_dict[f"file{file_num}_sentences"][
-                        global_sent_index
-                    ] = {
-                        "text": sentence_text,
-                        "paragraph_index": paragraph_index,
-                        "sentence_index": global_sent_index,
-                        "offset": offset_list[global_sent_index],
-                    }
+            for local_sent_index in local_sentence_indices:
+                global_sent_index = global_sent_indices[local_sent_index]
 
-                    self.edits_json_dict["alignments"][s1_index] = {
-                        "match": s2_indices,
-                        "edits": [
-                            {
-                                "edit_type": edit_type,
-                                "offset1": (
-                                    [-1, -1]
-                                    if edit_type == "insertion"
-                                    else offset_list[global_sent_index]
-                                ),
-                                "offset2": (
-                                    [-1, -1]
-                                    if edit_type == "deletion"
-                                    else offset_list[global_sent_index]
-                                ),
-                                "text1": (
-                                    "" if edit_type == "insertion" else sentence_text
-                                ),
-                                "text2": (
-                                    "" if edit_type == "deletion" else sentence_text
-                                ),
-                            }
-                        ],
-                    }
+                if edit_type == "deletion":
+                    offset_list = self.sentence_offsets1
+                    file_num = 1
+                    s1_index = global_sent_index
+                    s2_indices = [-1]
+                else:
+                    offset_list = self.sentence_offsets2
+                    file_num = 2
+                    s1_index = -1
+                    s2_indices = [global_sent_index]
+
+                sentence_text = paragraph_sentence_list[local_sent_index]
+                self.edits_json_dict[f"file{file_num}_sentences"][
+                    global_sent_index
+                ] = {
+                    "text": sentence_text,
+                    "paragraph_index": paragraph_index,
+                    "sentence_index": global_sent_index,
+                    "offset": offset_list[global_sent_index],
+                }
+
+                self.edits_json_dict["alignments"][s1_index] = {
+                    "match": s2_indices,
+                    "edits": [
+                        {
+                            "edit_type": edit_type,
+                            "offset1": (
+                                [-1, -1]
+                                if edit_type == "insertion"
+                                else offset_list[global_sent_index]
+                            ),
+                            "offset2": (
+                                [-1, -1]
+                                if edit_type == "deletion"
+                                else offset_list[global_sent_index]
+                            ),
+                            "text1": (
+                                "" if edit_type == "insertion" else sentence_text
+                            ),
+                            "text2": (
+                                "" if edit_type == "deletion" else sentence_text
+                            ),
+                        }
+                    ],
+                }
 
-                paragraph_html = self.format_edit(par_text, edit_type)
+            paragraph_html = self.format_edit(par_text, edit_type)
 
-                text_html[paragraph_index] = paragraph_html
-                self.num_edits += 1
+            text_html[paragraph_index] = paragraph_html
+            self.num_edits += 1
 
-    def add_aligned_paragraph(self, paragraph_dict, found_indices, full_html):
+    def add_aligned_paragraph(self, paragraph_parts, found_indices, full_html):
+        # The slots are indexed by local sentence position, so joining the
+        # claimed ones in order replaces the per-paragraph key sort the
+        # dict version needed.
         paragraph_html = " ".join(
-            [paragraph_dict[k] for k in sorted(paragraph_dict.keys())]
+            part for part in paragraph_parts if part is not None
         )
         if found_indices is not None:
             html_index = min(found_indices)
             if html_index not in full_html:
                 full_html[html_index] = paragraph_html
 
+    def _build_sent_base(self, paragraphs):
+        """
+        One pass over the paragraphs computing, for each paragraph index,
+        the global index of its first sentence (empty paragraphs count as
+        one sentence, matching get_sent_indices' historical behavior).
+        """
+        base = [0] * (len(paragraphs) + 1)
+        for i, p in enumerate(paragraphs):
+            base[i + 1] = base[i] + (len(p) if p and p[0] else 1)
+        return base
+
     def get_sent_indices(self, par_index, paragraphs, sentence_list):
         """
         Convert local indices (within paragraph) to global indices.
@@ -395,25 +607,19 @@ class EditsHtml:
             sentence_list (list of ints): The indices of the sentences
                 within the paragraph.
         """
-        sentence_offset = 0
-        i = 0
-
-        while i < par_index:
-            if paragraphs[i][0]:
-                sentence_offset += len(paragraphs[i])
-            else:
-                sentence_offset += 1
-            i += 1
+        base = self._sent_base1 if paragraphs is self.p1s else self._sent_base2
+        sentence_offset = base[par_index]
         return [j + sentence_offset for j in sentence_list]
 
     def get_token_offsets(self, token_offsets, sent_offset, par_index):
         """
         Convert local offsets (within sentence) to global offsets.
+        Returns an (N, 2) int64 array: one fused vector add instead of
+        constructing a Python tuple per token.
         """
-        # If not first paragraph, add one to count newline
-        return [
-            (begin + sent_offset, end + sent_offset) for (begin, end) in token_offsets
-        ]
+        offsets = np.asarray(token_offsets, dtype=np.int64).reshape(-1, 2)
+        offsets += sent_offset
+        return offsets
 
     def get_diff_html(self, par_alignment, sent_alignments):
         """
@@ -422,7 +628,20 @@ class EditsHtml:
         seen_p1s = set()
         seen_p2s = set()
 
+        # Phase 1 below walks the alignments and collects the sentence
+        # pairs to diff; phase 2 runs the diffs (in parallel when there
+        # are enough); phase 3 renders and merges the results back into
+        # the html/json state serially.
+        diff_tasks = []  # (s1, s2) per aligned sentence pair
+        pending = []  # Rendering context per task, in the same order
+        paragraph_contexts = []  # Per-pair html dicts to assemble in phase 3
+
         for i, (p1_list, p2_list) in enumerate(par_alignment):
+            # The paragraph lists do not change per aligned pair, so mark
+            # them seen once per alignment rather than inside the loop.
+            seen_p1s.update(p1_list)
+            seen_p2s.update(p2_list)
+
             # For each aligned paragraph
             for p1_index, p2_index in zip_longest(p1_list, p2_list):
                 if (p1_index is None) or (p2_index is None):
@@ -433,15 +652,15 @@ class EditsHtml:
 
                 aligned_par_id = uuid.uuid4()
 
-                par1_html = dict()
-                par2_html = dict()
+                # One slot per sentence across the aligned paragraph
+                # group, indexed by local sentence position; None marks an
+                # unclaimed slot.
+                par1_html = [None] * sum(len(self.p1s[p]) for p in p1_list)
+                par2_html = [None] * sum(len(self.p2s[p]) for p in p2_list)
 
                 found_p1_indices = None
                 found_p2_indices = None
 
-                seen_p1s.update(p1_list)
-                seen_p2s.update(p2_list)
-
                 for aligned_sent_id, el in enumerate(sent_alignments[i]):
                     if not el:
                         continue
@@ -477,39 +696,32 @@ class EditsHtml:
                     if (s1 is None) or (s2 is None):
                         continue
 
-                    diff, char_diff, (offsets1, offsets2) = diff_wordMode(s1, s2)
-
-                    token_offsets1 = self.get_token_offsets(
-                        offsets1, s1_dicts[0]["offset"][0], orig_p1_index
-                    )
-                    token_offsets2 = self.get_token_offsets(
-                        offsets2, s2_dicts[0]["offset"][0], orig_p2_index
-                    )
-
-                    s1_html, s2_html, edit_dicts = self.handle_diff(
-                        diff,
-                        char_diff,
-                        token_offsets1,
-                        token_offsets2,
-                        s1_indices,
-                        s2_indices,
-                    )
-
-                    par1_html[s1_list[0]] = self.format_hover(s1_html, aligned_sent_id)
-                    par2_html[s2_list[0]] = self.format_hover(s2_html, aligned_sent_id)
-
-                    # Add sentence indices that we've accounted for to paragraph dict
+                    # Claim the slots now so get_sentence's seen-filter
+                    # behaves as before; the hover slot is filled with the
+                    # rendered diff in phase 3.
+                    par1_html[s1_list[0]] = ""
+                    par2_html[s2_list[0]] = ""
                     for j in s1_list[1:]:
                         par1_html[j] = ""  # Placeholder
                     for j in s2_list[1:]:
                         par2_html[j] = ""  # Placeholder
 
-                    # Now add the alignments
-                    for s1_index in s1_indices:
-                        self.edits_json_dict["alignments"][int(s1_index)] = {
-                            "match": s2_indices,
-                            "edits": edit_dicts,
-                        }
+                    diff_tasks.append((s1, s2))
+                    pending.append(
+                        (
+                            aligned_sent_id,
+                            par1_html,
+                            par2_html,
+                            s1_list,
+                            s2_list,
+                            s1_indices,
+                            s2_indices,
+                            s1_dicts[0]["offset"][0],
+                            s2_dicts[0]["offset"][0],
+                            orig_p1_index,
+                            orig_p2_index,
+                        )
+                    )
 
                 if found_p1_indices is not None and orig_p1_index in found_p1_indices:
                     self.add_unaligned_sentences(
@@ -531,8 +743,87 @@ class EditsHtml:
                         self.sentence_offsets2,
                     )
 
-                self.add_aligned_paragraph(par1_html, found_p1_indices, self.html1)
-                self.add_aligned_paragraph(par2_html, found_p2_indices, self.html2)
+                paragraph_contexts.append(
+                    (par1_html, found_p1_indices, par2_html, found_p2_indices)
+                )
+
+        # Phase 2: the diffs are independent of each other and of the
+        # state mutated above, so they can run in a process pool.
+        diff_results = _run_diffs(diff_tasks)
+
+        # Phase 3: render and merge serially.
+        for context, (diff, char_diff, (offsets1, offsets2), token_counts) in zip(
+            pending, diff_results
+        ):
+            (
+                aligned_sent_id,
+                par1_html,
+                par2_html,
+                s1_list,
+                s2_list,
+                s1_indices,
+                s2_indices,
+                sent_offset1,
+                sent_offset2,
+                orig_p1_index,
+                orig_p2_index,
+            ) = context
+
+            token_offsets1 = self.get_token_offsets(
+                offsets1, sent_offset1, orig_p1_index
+            )
+            token_offsets2 = self.get_token_offsets(
+                offsets2, sent_offset2, orig_p2_index
+            )
+
+            s1_html_parts, s2_html_parts, edits_record = self.handle_diff(
+                diff,
+                char_diff,
+                token_offsets1,
+                token_offsets2,
+                s1_indices,
+                s2_indices,
+                token_counts=token_counts,
+            )
+
+            par1_html[s1_list[0]] = self.format_hover(s1_html_parts, aligned_sent_id)
+            par2_html[s2_list[0]] = self.format_hover(s2_html_parts, aligned_sent_id)
+
+            # Now add the alignments; the record converts to the JSON
+            # dict form once, below.
+            for s1_index in s1_indices:
+                self.edits_json_dict["alignments"][int(s1_index)] = {
+                    "match": s2_indices,
+                    "edits": edits_record,
+                }
+
+        for par1_html, found_p1_indices, par2_html, found_p2_indices in (
+            paragraph_contexts
+        ):
+            self.add_aligned_paragraph(par1_html, found_p1_indices, self.html1)
+            self.add_aligned_paragraph(par2_html, found_p2_indices, self.html2)
 
         self.add_unaligned_paragraphs("deletion", seen_p1s, self.html1, self.p1s)
         self.add_unaligned_paragraphs("insertion", seen_p2s, self.html2, self.p2s)
+
+        # Materialize the JSON dict form once per unique record; a record
+        # shared by several s1 indices is converted a single time and the
+        # converted list shared, just as the dicts used to be.
+        converted = {}
+        for alignment in self.edits_json_dict["alignments"].values():
+            edits = alignment["edits"]
+            if isinstance(edits, EditsRecord):
+                dicts = converted.get(id(edits))
+                if dicts is None:
+                    dicts = edits.to_dicts()
+                    converted[id(edits)] = dicts
+                alignment["edits"] = dicts
+
+        # Fill the sentence slots nothing claimed with distinct
+        # placeholder dicts, matching the output shape of the old eager
+        # initialization.
+        for key in ("file1_sentences", "file2_sentences"):
+            sentences = self.edits_json_dict[key]
+            for index, sentence_dict in enumerate(sentences):
+                if sentence_dict is None:
+                    sentences[index] = {"text": "", "offset": (-1, -1)}
@@ -3,6 +3,7 @@ Tests for the token-level diff. Check that the modified diff-match-patch
 is returning what we expect for deletion, insertion, and substitution.
 """
 from revisions import diff_wordMode
+from revisions import diff as diff_module
 
 
 def test_deletes():
@@ -33,6 +34,48 @@ def test_inserts():
             == [(0, 'Insertion '), (1, 'here '), (0, 'in the middle ')]
     
 
+def test_char_diff_is_independent():
+    # char_diff must stay encoded after diff is decoded in place
+    diff, char_diff, offsets, token_counts = diff_wordMode(
+        "Deletion in the middle",
+        "Deletion in middle")
+    assert diff != char_diff
+    assert token_counts == [len(ids) for _, ids in char_diff]
+
+    diff[0] = (0, "mutated")
+    assert char_diff[0] != (0, "mutated")
+
+
+def test_multiline_offsets():
+    # Token offsets must accumulate across lines (they used to be
+    # overwritten per line, keeping only the last line's spans), and each
+    # span must map back to the exact source text.
+    text1 = "One two\nthree four\nfive six"
+    text2 = "One two\nthree changed\nfive six"
+
+    def spans(t1, t2):
+        _, _, (offsets1, offsets2), _ = diff_wordMode(t1, t2)
+        return (
+            [t1[b:e] for b, e in offsets1],
+            [t2[b:e] for b, e in offsets2],
+        )
+
+    expected = (
+        ["One", "two", "three", "four", "five", "six"],
+        ["One", "two", "three", "changed", "five", "six"],
+    )
+    assert spans(text1, text2) == expected
+
+    # The spans must be identical whichever diff engine ran; force the
+    # diff-match-patch fallback and compare.
+    saved = diff_module.edlib
+    diff_module.edlib = None
+    try:
+        assert spans(text1, text2) == expected
+    finally:
+        diff_module.edlib = saved
+
+
 def test_substitutes():
     # Subtitute at the end with overlapping chars
     assert diff_wordMode(
@@ -4,23 +4,61 @@ Utilities for (1) reading and writing pickles,
 (4) applying a function to a DataFrame with multiprocessing.
 """
 
+import functools
 import gc
+import itertools
 import json
+import mmap
 import multiprocessing as mp
 import os
 import pickle
+import struct
 import sys
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from unicodedata import normalize
 
-from nltk.tokenize import word_tokenize
-from nltk.tokenize import sent_tokenize as sentence_tokenize
+import spacy
+
+try:
+    from joblib import Parallel, delayed
+except ImportError:  # joblib ships alongside scikit-learn; optional here
+    Parallel = delayed = None
+
+try:
+    import msgspec
+except ImportError:  # Optional, fastest JSON decoder of the chain
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # Optional fast JSON; the stdlib is the fallback
+    orjson = None
 
 from tqdm import tqdm
 
 tqdm.pandas()
 
 
+# Tokenization here needs no model weights: a blank English pipeline with
+# the rule-based sentencizer covers word and sentence splitting. Built
+# lazily so importing utils for the pickle/JSON helpers stays cheap.
+_NLP = None
+
+# Paragraphs handed to nlp.pipe per batch; batching amortizes the
+# Python-to-C crossings, which is where the per-paragraph time goes since
+# the tokenizer itself holds the GIL.
+_PIPE_BATCH_SIZE = 1000
+
+
+def _get_nlp():
+    global _NLP
+    if _NLP is None:
+        _NLP = spacy.blank("en")
+        _NLP.add_pipe("sentencizer")
+    return _NLP
+
+
 _NON_ASCII = [
     ("\u2026", "..."),  # horizontal ellipsis
     ("\u201c", "``"),  # left double quotation mark
@@ -31,6 +69,18 @@ _NON_ASCII = [
     ("\u00a0", " "),
 ]  # no-break space
 
+# Every source is a single code point, so the whole replacement list
+# collapses into one translate table applied in a single pass.
+_NON_ASCII_TABLE = str.maketrans(
+    {unicode_str: ascii_str for unicode_str, ascii_str in _NON_ASCII}
+)
+
+
+# Relative directory names that get created under config["root"]; the
+# old lookup referenced this without defining it, so any non-key access
+# raised a NameError.
+DIRS = ()
+
 
 class Config:
     def __init__(self, config_json):
@@ -38,8 +88,14 @@ class Config:
         Args:
             config_json (str): Path to the configuration JSON file.
         """
-        with open(config_json) as infile:
-            self.config = json.load(infile)
+        with open(config_json, "rb") as infile:
+            self.config = _json_loads(infile.read())
+
+        # Create the DIRS subtree once here and memoize resolved paths,
+        # so lookups in hot loops never hit the filesystem.
+        self._paths = {}
+        for name in DIRS:
+            os.makedirs(os.path.join(self.config["root"], name), exist_ok=True)
 
     def __getitem__(self, name):
         """
@@ -48,19 +104,34 @@ class Config:
             name (str): Either a key in the configuration or
                 a path that is relative to config["root"].
         """
-        if name in self.config:
-            return os.path.join(self.config["root"], self.config[name])
-        else:
-            path = os.path.join(self.config["root"], name)
-            if (name in DIRS) and (not os.path.exists(path)):
-                os.makedirs(path)
-            return path
+        path = self._paths.get(name)
+        if path is None:
+            if name in self.config:
+                path = os.path.join(self.config["root"], self.config[name])
+            else:
+                path = os.path.join(self.config["root"], name)
+            self._paths[name] = path
+        return path
 
 
 def unicode_normalize(unicode_text):
-    for unicode_str, ascii_str in _NON_ASCII:
-        unicode_text = unicode_text.replace(ascii_str, unicode_str)
-    return normalize("NFKD", unicode_text)
+    # ASCII text is a fixed point of both the table and NFKD, so a single
+    # C-level scan short-circuits the whole normalization for the common
+    # case.
+    if unicode_text.isascii():
+        return unicode_text
+    # The old per-entry replace loop also had its arguments reversed,
+    # mapping ASCII sequences *to* the Unicode punctuation; the table
+    # applies the intended direction.
+    return normalize("NFKD", unicode_text.translate(_NON_ASCII_TABLE))
+
+
+# Sentences recur across documents (headers, boilerplate, short
+# paragraphs), so sentence-level call sites go through this cached
+# wrapper. `unicode_normalize` itself stays uncached: it also normalizes
+# whole file contents, and the cache is bounded in entries, not bytes, so
+# caching those would pin entire documents in memory.
+unicode_normalize_sentence = functools.lru_cache(maxsize=100_000)(unicode_normalize)
 
 
 def _apply_df(apply_arg_tuple):
@@ -70,17 +141,42 @@ def _apply_df(apply_arg_tuple):
             group (pd.DataFrame):   One group of a dataframe grouped by doc ID.
             func (function):        Function to apply to the dataframe.
             kwargs (dict):          Keyword arguments to func.
+                `apply_to_column` (str) hands func that column as a numpy
+                array; `apply_to_row` calls func once per row namedtuple;
+                otherwise func gets the whole group.
     """
     group, func, kwargs = apply_arg_tuple
-    if "apply_to_row" in kwargs and kwargs["apply_to_row"]:
-        group.progress_apply(lambda row: func(row, **kwargs), axis=1)
+    if kwargs.get("apply_to_column"):
+        # Vectorized path: func gets the whole column as one ndarray and
+        # must be array-aware, instead of a Python call per row.
+        func(group[kwargs["apply_to_column"]].to_numpy(), **kwargs)
+    elif "apply_to_row" in kwargs and kwargs["apply_to_row"]:
+        # itertuples hands func a namedtuple per row; axis=1 apply built a
+        # Series for every row and the per-row tqdm bar was pure noise
+        # inside a worker process.
+        for row in group.itertuples(index=False, name="Row"):
+            func(row, **kwargs)
     else:
         func(group, **kwargs)
 
 
+def _apply_chunk(apply_arg_tuple):
+    """
+    Run `_apply_df` over a whole chunk of groups inside the worker, so
+    `func` and `kwargs` are pickled once per chunk rather than per group.
+    Args:
+        apply_arg_tuple (args):  3-tuple (chunk, func, kwargs)
+    """
+    chunk, func, kwargs = apply_arg_tuple
+    for group in chunk:
+        _apply_df((group, func, kwargs))
+
+
 def multiprocessing_apply_df(groups, func, **kwargs):
     """
     Pass each chunk to `_apply_df` keeping all other arguments constant.
+    Groups are batched into roughly 2 chunks per worker; submitting one
+    task per group drowned many-small-group runs in pickling and IPC.
 
     Args:
         groups (pd.DataFrame):  Dataframe grouped along a dimension,
@@ -88,57 +184,219 @@ def multiprocessing_apply_df(groups, func, **kwargs):
         func (function):        Function to apply to the dataframe.
     """
     group_names, groups = zip(*groups)
-    apply_args = [(d, func, kwargs) for d in groups]
 
-    with ProcessPoolExecutor(max_workers=10) as executor:
-        jobs = [executor.submit(_apply_df, a) for a in apply_args]
+    # Pool startup (fork/spawn plus imports) easily exceeds the work on
+    # small jobs; run those inline.
+    total_rows = sum(len(g) for g in groups)
+    if len(groups) < 4 or total_rows < 10_000:
+        return [_apply_df((g, func, kwargs)) for g in groups]
+
+    max_workers = os.cpu_count() or 1
+    num_chunks = min(len(groups), 2 * max_workers)
+    # Strided slicing keeps the chunk sizes within one of each other
+    chunks = [groups[i::num_chunks] for i in range(num_chunks)]
+
+    if Parallel is not None:
+        # loky reuses its workers and memoizes the pickled function
+        # across batches, so repeated calls skip most of the setup the
+        # plain executor pays every time.
+        return Parallel(n_jobs=max_workers, backend="loky", batch_size="auto")(
+            delayed(_apply_chunk)((c, func, kwargs)) for c in chunks
+        )
+
+    # Build the tokenizer in the parent before the pool exists: with the
+    # fork start method every worker then inherits it copy-on-write
+    # instead of constructing its own on first use.
+    _get_nlp()
+
+    # fork starts workers without re-importing the interpreter state
+    mp_context = mp.get_context("fork") if os.name == "posix" else None
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=mp_context
+    ) as executor:
+        jobs = [executor.submit(_apply_chunk, (c, func, kwargs)) for c in chunks]
         results = []
-        for job in tqdm(as_completed(jobs), total=len(jobs)):
+        # No bar when stderr is redirected (CI, logs), and at most ~1
+        # repaint per second when it is a terminal.
+        for job in tqdm(
+            as_completed(jobs),
+            total=len(jobs),
+            disable=not sys.stderr.isatty(),
+            mininterval=1.0,
+        ):
             results.append(job.result())
     return results
 
 
+@contextmanager
+def _no_gc():
+    """
+    Pause garbage collection around pickle I/O. gc.freeze() parks the
+    existing heap in the permanent generation so the collector does not
+    rescan it for the objects unpickling allocates, and the previous
+    enabled state is restored afterwards instead of unconditionally
+    re-enabling (which clobbered callers that had GC off).
+    """
+    was_enabled = gc.isenabled()
+    gc.freeze()
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.unfreeze()
+        if was_enabled:
+            gc.enable()
+
+
+# Protocol 5 lets NumPy/pandas payloads hand their backing buffers to a
+# callback instead of copying them through pickle's frames; the buffers
+# go into a companion "<path>.buf" file that is memory-mapped on load.
+_OUT_OF_BAND = pickle.HIGHEST_PROTOCOL >= 5
+
+
+def _read_buffers(buf_path):
+    """
+    Memory-map a companion buffer file and return views of the out-of-band
+    buffers it holds (a count, the lengths, then the raw bytes back to
+    back). ACCESS_COPY maps the pages copy-on-write: reads stay zero-copy,
+    but the views are writable, so arrays reconstructed over them can be
+    mutated by callers (ACCESS_READ made every loaded array read-only).
+    """
+    with open(buf_path, "rb") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+    (count,) = struct.unpack_from("<q", view, 0)
+    lengths = struct.unpack_from("<{}q".format(count), view, 8)
+
+    buffers = []
+    offset = 8 + 8 * count
+    for length in lengths:
+        buffers.append(view[offset : offset + length])
+        offset += length
+    return buffers
+
+
 def read_pickle(path):
     if not os.path.exists(path):
         return None
-    gc.disable()
-    with open(path, "rb") as handle:
-        res = pickle.load(handle)
-    gc.enable()
+    with _no_gc():
+        # Read the file into one contiguous buffer first; pickle.loads
+        # walks memory directly instead of paying a stream call per read.
+        with open(path, "rb") as handle:
+            data = handle.read()
+
+        buf_path = path + ".buf"
+        buffers = None
+        if _OUT_OF_BAND and os.path.exists(buf_path):
+            buffers = _read_buffers(buf_path)
+        res = pickle.loads(data, buffers=buffers)
     return res
 
 
 def write_pickle(path, obj):
-    gc.disable()
-    with open(path, "wb") as handle:
-        pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    gc.enable()
+    with _no_gc():
+        buffers = []
+        # 1 MiB buffer coalesces pickle's many small writes into few
+        # write(2) syscalls; reads already slurp the file in one call.
+        with open(path, "wb", buffering=1 << 20) as handle:
+            if _OUT_OF_BAND:
+                pickle.dump(
+                    obj,
+                    handle,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                    buffer_callback=buffers.append,
+                )
+            else:
+                pickle.dump(obj, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+        buf_path = path + ".buf"
+        if buffers:
+            raws = [buf.raw() for buf in buffers]
+            with open(buf_path, "wb", buffering=1 << 20) as handle:
+                handle.write(struct.pack("<q", len(raws)))
+                for raw in raws:
+                    handle.write(struct.pack("<q", raw.nbytes))
+                for raw in raws:
+                    handle.write(raw)
+        elif os.path.exists(buf_path):
+            # Don't let a stale companion shadow a rewrite without buffers
+            os.remove(buf_path)
+
+
+def _json_loads(data):
+    # Fastest available decoder wins; all three accept the same bytes
+    # and produce plain dicts/lists.
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 def read_json(path):
     if not os.path.exists(path):
         return None
-    with open(path) as handle:
-        return json.load(handle)
+    with open(path, "rb") as handle:
+        return _json_loads(handle.read())
 
 
 def write_json(path, obj):
+    if orjson is not None:
+        # orjson emits UTF-8 bytes directly; OPT_NON_STR_KEYS covers the
+        # integer sentence indices used as alignment keys.
+        with open(path, "wb") as handle:
+            return handle.write(
+                orjson.dumps(
+                    obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                )
+            )
     with open(path, "w") as handle:
         return json.dump(obj, handle, ensure_ascii=False, indent=2)
 
 
-def tokenize_sentences(paragraphs):
+def iter_sentences(paragraphs):
     """
-    Tokenize the sentences.
+    Lazily tokenize the sentences, yielding them as they are produced so
+    large documents never hold the full sentence list in memory.
     Each empty newline is considered its own sentence.
+    The non-empty paragraphs go through `nlp.pipe` in batches.
     """
-    sentences = []
-    for par in paragraphs:
+    # tee lets one pass feed nlp.pipe while the other interleaves the
+    # empty paragraphs back in; pipe pulls lazily, so the tee buffer
+    # stays around one batch deep.
+    emit, feed = itertools.tee(paragraphs)
+    docs = _get_nlp().pipe(
+        (par for par in feed if par.strip()), batch_size=_PIPE_BATCH_SIZE
+    )
+
+    for par in emit:
         if not par.strip():
-            sentences.append(par)
+            yield par
         else:
-            sentences.extend(sentence_tokenize(par))
-    return sentences
+            yield from (sent.text for sent in next(docs).sents)
+
+
+def tokenize_sentences(paragraphs):
+    """
+    Tokenize the sentences.
+    Each empty newline is considered its own sentence.
+    List-materializing wrapper around `iter_sentences`.
+    """
+    return list(iter_sentences(paragraphs))
+
+
+def tokenize_texts(texts):
+    """
+    Args:
+        texts (str list)
+    Returns:
+        One whitespace-joined token string per text, batched through
+        `nlp.pipe` so the pipeline crossings are amortized.
+    """
+    # Only the token stream matters here, so go straight through the
+    # tokenizer and skip the sentencizer component.
+    docs = _get_nlp().tokenizer.pipe(texts, batch_size=_PIPE_BATCH_SIZE)
+    return [" ".join(token.text for token in doc) for doc in docs]
 
 
 def tokenize_text(text):
@@ -149,8 +407,4 @@ def tokenize_text(text):
         Word-tokenized and sentence-tokenized string, joined on whitespace.
         Paragraphs are joined by newlines.
     """
-    tokenized_pars = []
-    for par in text.split("\n"):
-        r = " ".join([" ".join(word_tokenize(s)) for s in sentence_tokenize(par)])
-        tokenized_pars.append(r)
-    return "\n".join(tokenized_pars)
+    return "\n".join(tokenize_texts(text.split("\n")))